@@ -0,0 +1,42 @@
+import sys
+
+from main import render_html, render_sections
+
+# Sectioned rendering of large documents must match the whole-document render
+CASES = {
+    "longer fence containing a shorter one": (
+        "# T\n\n````md\n```\n````\n\n```sh\necho hi\n\n## not a heading\n```\n"
+    ),
+    "fence line with info string inside a block": (
+        "```\n```python\n\n## inside code\n```"
+    ),
+    "reference links across sections": (
+        "# A\n\ntext [link][r]\n\n````md\n```\n````\n\n## B\n\n[r]: http://example.com\n\n"
+        "```py\nx = 1\n```\n\n## C\n\nmore [link][r]\n"
+    ),
+    "code blocks, lists and quotes at section ends": (
+        "## a\n\n    code\n\n## b\n\n- x\n- y\n\n## c\n\n> q\n\n## d\n\n~~~\n## tilde\n~~~\n"
+    ),
+    "definition inside a blockquote": (
+        "See [docs][q].\n\n## Usage\n\n> [q]: http://example.com\n"
+    ),
+    "definition inside a list item": (
+        "See [docs][q].\n\n## Usage\n\n- [q]: http://example.com\n"
+    ),
+    "repeated definition label": (
+        "[q]: http://a.example\n\nSee [docs][q].\n\n## Usage\n\n[q]: http://b.example\n"
+    ),
+    "repeated headings": "\n\n".join(
+        f"## Usage\n\nPara {i} [x][r] $a \\\\ b$.\n\n```python\n## comment\nx = {i}\n```\n\n"
+        f"| a | b |\n|---|---|\n| 1 | 2 |\n\n### Sub {i % 7}\n\ntext"
+        for i in range(200)
+    ) + "\n\n[r]: http://example.com/r\n",
+}
+
+failed = 0
+for name, text in CASES.items():
+    ok = render_html(text) == render_sections(text)
+    print(f"{'OK  ' if ok else 'FAIL'} {name}")
+    failed += not ok
+
+sys.exit(1 if failed else 0)
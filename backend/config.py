@@ -11,7 +11,7 @@ class Config:
         self.default_exclude = 'archive,node_modules,.git,__pycache__,venv,.venv,dist,build'
         self.exclude_dirs = []
         self.exclude_paths_abs = []
-        self.exclude_names = []
+        self.exclude_names = frozenset()
         
         self.reload_excludes(os.environ.get('MDVIEW_EXCLUDE_DIRS', ''))
     
@@ -32,16 +32,18 @@ class Config:
 
     def reload_excludes(self, exclude_str: str):
         raw_dirs = exclude_str.split(',') + self.default_exclude.split(',') if exclude_str else self.default_exclude.split(',')
-        self.exclude_dirs = list(set([d.strip() for d in raw_dirs if d.strip()]))
+        self.exclude_dirs = sorted(set([d.strip() for d in raw_dirs if d.strip()]))
         
         self.exclude_paths_abs.clear()
-        self.exclude_names.clear()
+        exclude_names = set()
         for d in self.exclude_dirs:
             d_lower = d.lower()
             if d.startswith('/') or d.startswith('~'):
                 self.exclude_paths_abs.append(Path(os.path.expanduser(d)).resolve().as_posix().lower())
             else:
-                self.exclude_names.append(d_lower)
+                exclude_names.add(d_lower)
+        # A set: the nav and search walks test every directory entry against it
+        self.exclude_names = frozenset(exclude_names)
                 
     def is_path_excluded(self, file_path: Path) -> bool:
         try:
@@ -54,7 +56,8 @@ class Config:
         
         if self.exclude_paths_abs:
             file_abs_str = file_path.resolve().as_posix().lower()
-            docs_dir_str = self.docs_dir.resolve().as_posix().lower()
+            # docs_dir is resolved when it is set, so no filesystem call here
+            docs_dir_str = self.docs_dir.as_posix().lower()
             for abs_path in self.exclude_paths_abs:
                 if docs_dir_str.startswith(abs_path + '/') or docs_dir_str == abs_path:
                     continue
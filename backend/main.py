@@ -4,12 +4,22 @@ from pathlib import Path
 from pydantic import BaseModel
 import os
 import json
-import uvicorn
 import aiofiles
 from contextlib import asynccontextmanager
 import asyncio
-from fastapi.responses import StreamingResponse
-from watchfiles import awatch, Change
+import hashlib
+import importlib.metadata
+import mimetypes
+import re
+import threading
+import markdown
+import nh3
+from markdown.blockprocessors import ReferenceProcessor
+from markdown.extensions.fenced_code import FencedBlockPreprocessor
+from markdown.extensions.toc import unique as toc_unique
+from collections import OrderedDict
+from fastapi.responses import StreamingResponse, FileResponse
+from watchfiles import awatch, Change, DefaultFilter
 
 # Import core config
 from config import cfg
@@ -29,29 +39,105 @@ class EditRequest(BaseModel):
     content: str
     path: str
 
-# Caching for nav tree
+# Caching for nav tree, stored pre-encoded as the JSON response body
 nav_cache = {
     "mtime": 0,
-    "tree": []
+    "body": b""
 }
 
+# Caching for encoded /api/file payloads, keyed by resolved path and
+# invalidated whenever the file's (mtime_ns, size) signature changes. Each
+# payload holds the raw markdown and its HTML, so the cache is bounded by total
+# payload bytes rather than entry count. Only the event loop touches it.
+RENDER_CACHE_BYTES = 64 * 1024 * 1024
+render_cache = OrderedDict()
+render_cache_state = {"bytes": 0}
+
+def drop_render_payload(key):
+    cached = render_cache.pop(key, None)
+    if cached:
+        render_cache_state["bytes"] -= len(cached[2])
+
+# Part of every ETag so browsers drop their copies when the rendered HTML can
+# change for the same source. Bump RENDER_PIPELINE with any change to
+# parse_markdown or its helpers; library upgrades are picked up on their own.
+RENDER_PIPELINE = 1
+RENDER_VERSION = f"{RENDER_PIPELINE}-md{markdown.__version__}-nh3{importlib.metadata.version('nh3')}"
+
+# Markdown converters: building one registers every extension, so each
+# executor thread keeps its own and resets it between documents. Per-thread
+# instances let a small file render while a large one is still converting.
+md_local = threading.local()
+
+def get_md_converter():
+    md = getattr(md_local, "md", None)
+    if md is None:
+        md = md_local.md = markdown.Markdown(extensions=['fenced_code', 'tables', 'toc', 'codehilite'])
+    return md
+
+# Lower-cased file contents for search, keyed by path and validated by mtime.
+# Bounded by total text size (characters, close to bytes for most docs) and
+# evicted least recently searched first; files over the budget are not kept.
+SEARCH_CACHE_BYTES = 32 * 1024 * 1024
+search_cache = OrderedDict()
+search_cache_state = {"bytes": 0}
+search_cache_lock = threading.Lock()
+
+def drop_search_text(key):
+    with search_cache_lock:
+        cached = search_cache.pop(key, None)
+        if cached:
+            search_cache_state["bytes"] -= len(cached[1])
+
+# Rendered HTML keyed by a hash of the markdown source, shared by executor
+# threads and bounded by total HTML size like search_cache
+HTML_CACHE_BYTES = 32 * 1024 * 1024
+html_cache = OrderedDict()
+html_cache_state = {"bytes": 0}
+html_cache_lock = threading.Lock()
+
+# Per-section HTML for large documents, keyed by a hash of the section source
+SECTIONED_RENDER_SIZE = 256 * 1024
+SECTION_CACHE_SIZE = 4096
+SECTION_END = '\n\nmdviewer-section-end'
+SECTION_END_HTML = '<p>mdviewer-section-end</p>'
+section_cache = OrderedDict()
+section_cache_lock = threading.Lock()
+
 # SSE Client queues
 clients = set()
 
+class MarkdownFilter(DefaultFilter):
+    """DefaultFilter (skips .git, node_modules, ...) restricted to .md files."""
+
+    def __call__(self, change, path):
+        return path.lower().endswith(".md") and super().__call__(change, path)
+
 async def file_watcher():
-    async for changes in awatch(cfg.docs_dir):
+    # Filtering inside awatch drops non-markdown churn before it reaches us
+    async for changes in awatch(cfg.docs_dir, watch_filter=MarkdownFilter()):
         for change, path in changes:
-            if path.lower().endswith(".md"):
-                # Invalidate cache if there's a new or deleted file
-                if change in (Change.added, Change.deleted):
-                    nav_cache["mtime"] = 0
-                
-                # Notify all clients
-                for q in clients:
-                    try:
-                        q.put_nowait({"type": "file_change", "path": path})
-                    except asyncio.QueueFull:
-                        pass
+            # Invalidate cache if there's a new or deleted file
+            if change in (Change.added, Change.deleted):
+                nav_cache["mtime"] = 0
+            if change == Change.deleted:
+                drop_search_text(path)
+                drop_render_payload(path)
+
+            # With no open tabs (e.g. a bulk checkout while the UI is closed)
+            # only the cache bookkeeping above is needed
+            if not clients:
+                continue
+
+            # Notify all clients; the SSE frame is serialized once, not per client
+            rel_path = Path(os.path.relpath(path, cfg.docs_dir)).as_posix()
+            event = {"type": "file_change", "change": change.name, "path": rel_path}
+            message = f"data: {json.dumps(event)}\n\n"
+            for q in clients:
+                try:
+                    q.put_nowait(message)
+                except asyncio.QueueFull:
+                    pass
 
 @app.on_event("startup")
 async def startup_event():
@@ -70,8 +156,7 @@ async def events(request: Request):
             while True:
                 if await request.is_disconnected():
                     break
-                event = await q.get()
-                yield f"data: {json.dumps(event)}\n\n"
+                yield await q.get()
         finally:
             clients.remove(q)
             
@@ -80,17 +165,12 @@ async def events(request: Request):
 @app.get("/api/nav")
 def get_navigation():
     current_mtime = os.stat(cfg.docs_dir).st_mtime
-    if nav_cache["mtime"] == current_mtime and nav_cache["tree"]:
-        return nav_cache["tree"]
-
-    def build_json_tree(dir_path, rel_path="", depth=0, visited=None):
-        if visited is None:
-            visited = set()
-        real_path = os.path.realpath(dir_path)
-        if real_path in visited:
-            return []
-        visited.add(real_path)
+    if nav_cache["mtime"] == current_mtime and nav_cache["body"]:
+        return Response(content=nav_cache["body"], media_type="application/json")
 
+    # Symlinks are never descended (is_dir(follow_symlinks=False)), so the
+    # walk cannot cycle and needs no realpath()-based visited set
+    def build_json_tree(dir_path, rel_path=""):
         items = []
         try:
             with os.scandir(dir_path) as it:
@@ -98,25 +178,25 @@ def get_navigation():
                     name = entry.name
                     if name.startswith('.'):
                         continue
-                    if name.lower() in cfg.exclude_names:
+                    name_lower = name.lower()
+                    if name_lower in cfg.exclude_names:
                         continue
                         
                     is_dir = entry.is_dir(follow_symlinks=False)
-                    if not is_dir and not name.lower().endswith('.md'):
+                    if not is_dir and not name_lower.endswith('.md'):
                         continue
                         
-                    full_path = entry.path
                     item_rel = f"{rel_path}/{name}" if rel_path else name
-                    items.append((name, is_dir, item_rel, full_path))
+                    items.append((not is_dir, name_lower, name, item_rel, entry.path))
         except OSError:
             pass
 
-        items.sort(key=lambda x: (not x[1], x[0].lower()))
+        items.sort()
 
         result = []
-        for name, is_dir, item_rel, full_path in items:
-            if is_dir:
-                children = build_json_tree(full_path, item_rel, depth + 1, visited.copy())
+        for is_file, _, name, item_rel, full_path in items:
+            if not is_file:
+                children = build_json_tree(full_path, item_rel)
                 if children:
                     result.append({"name": name, "path": item_rel, "is_dir": True, "children": children})
             else:
@@ -124,9 +204,12 @@ def get_navigation():
         return result
 
     tree = build_json_tree(str(cfg.docs_dir))
+    # Encode once per rebuild; cache hits then skip FastAPI's jsonable_encoder
+    # walk over every node of the tree and the JSON dump
+    body = json.dumps(tree, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
     nav_cache["mtime"] = current_mtime
-    nav_cache["tree"] = tree
-    return tree
+    nav_cache["body"] = body
+    return Response(content=body, media_type="application/json")
 
 @app.get("/api/config")
 async def get_config():
@@ -143,104 +226,283 @@ async def update_config(req: ConfigRequest):
     nav_cache["mtime"] = 0
     return {"status": "ok"}
 
-@app.get("/api/file")
-async def get_file(path: str = ""):
-    if not path:
-        path = cfg.default_file
-        
-    file_path = (cfg.docs_dir / path).resolve()
-    try:
-        file_path.relative_to(cfg.docs_dir.resolve())
-    except ValueError:
-        raise HTTPException(status_code=403, detail="Access Denied")
+# Markdown pre-processing and HTML post-processing patterns
+LIST_ITEM_RE = re.compile(r'\s*(?:[*+-]|\d+\.)\s+')
+MERMAID_BLOCK_RE = re.compile(r'<pre[^>]*><code class="language-mermaid">(.*?)</code></pre>', re.DOTALL | re.IGNORECASE)
+DISPLAY_MATH_RE = re.compile(r'\$\$.*?\$\$', re.DOTALL)
+INLINE_MATH_RE = re.compile(r'(?<!\$)\$(?!\$)(.+?)(?<!\$)\$(?!\$)')
 
-    if not file_path.exists() or file_path.suffix.lower() != '.md':
-        raise HTTPException(status_code=404, detail="Markdown file not found")
-        
-    async with aiofiles.open(file_path, mode='r', encoding='utf-8') as f:
-        md_content = await f.read()
+REF_DEF_RE = ReferenceProcessor.RE
+RAW_HTML_BLOCK_RE = re.compile(r'^ {0,3}<', re.MULTILINE)
+FENCED_BLOCK_RE = FencedBlockPreprocessor.FENCED_BLOCK_RE
+HEADING_ID_RE = re.compile(r'(<h[1-6][^>]*?\bid=")([^"]*)"')
+
+# An indented opening fence, its body, and the closing fence (or end of text)
+INDENTED_FENCE_RE = re.compile(
+    r'^(?P<indent>[ \t]{2,})(?P<fence>```[^\n]*?)[ \t]*'
+    r'(?:\n(?P<body>.*?)(?:^(?P<close>[ \t]*```[ \t]*)$|\Z)|\Z)',
+    re.MULTILINE | re.DOTALL
+)
+
+def dedent_fence(m):
+    if m.group('body') is None:
+        return m.group('fence')
+    indent = len(m.group('indent'))
+    prefix = ' ' * indent
+    body = '\n'.join(
+        line[indent:] if line.startswith(prefix) else line.strip()
+        for line in m.group('body').split('\n')
+    )
+    return f"{m.group('fence')}\n{body}{'```' if m.group('close') else ''}"
+
+# Fix double-escaped backslashes inside LaTeX math blocks
+# python-markdown escapes \ to \\ in paragraph text, which breaks KaTeX
+def fix_latex_escapes(m):
+    return m.group(0).replace('\\\\', '\\')
+
+def parse_markdown(content):
+    md_content_fixed = content.replace('\r\n', '\n').replace('\r', '\n')
+    lines = md_content_fixed.split('\n')
     
-    loop = asyncio.get_running_loop()
+    # Pre-process lists to ensure they have a blank line before them (standard Markdown requirement)
+    list_fixed_lines = []
+    prev_line, prev_is_list = '', False
+    for line in lines:
+        is_list_item = LIST_ITEM_RE.match(line) is not None
+        if is_list_item and prev_line.strip() != '' and not prev_is_list:
+            list_fixed_lines.append('')
+        list_fixed_lines.append(line)
+        prev_line, prev_is_list = line, is_list_item
+    lines = list_fixed_lines
+
+    md_content_fixed = '\n'.join(lines)
+
+    # Dedent fenced code blocks that are indented (e.g. nested under list items).
+    # Each regex pass below is skipped when the literal it needs is absent;
+    # a substring check is far cheaper than a full-document regex scan.
+    if '```' in md_content_fixed:
+        md_content_fixed = INDENTED_FENCE_RE.sub(dedent_fence, md_content_fixed)
+
+    # Sectioned rendering only applies to large documents, and not when a
+    # [TOC] marker or raw HTML block (which may span headings) needs the
+    # whole document in one pass
+    if (len(md_content_fixed) < SECTIONED_RENDER_SIZE
+            or '[TOC]' in md_content_fixed
+            or RAW_HTML_BLOCK_RE.search(md_content_fixed)):
+        return render_html(md_content_fixed)
+    return render_sections(md_content_fixed)
+
+def render_html(source):
+    md = get_md_converter()
+    md.reset()
+    html_content = md.convert(source)
+    html_content = nh3.clean(html_content, attributes={**nh3.ALLOWED_ATTRIBUTES, "*": {"class", "id", "style"}})
     
-    def parse_markdown(content):
-        import markdown
-        import nh3
-        import re
-        
-        md_content_fixed = content.replace('\r\n', '\n').replace('\r', '\n')
-        lines = md_content_fixed.split('\n')
-        
-        # Pre-process lists to ensure they have a blank line before them (standard Markdown requirement)
-        list_fixed_lines = []
-        for i, line in enumerate(lines):
-            is_list_item = re.match(r'^\s*[*+-]\s+', line) or re.match(r'^\s*\d+\.\s+', line)
-            if is_list_item and i > 0 and lines[i-1].strip() != '':
-                prev_is_list = re.match(r'^\s*[*+-]\s+', lines[i-1]) or re.match(r'^\s*\d+\.\s+', lines[i-1])
-                if not prev_is_list:
-                    list_fixed_lines.append('')
-            list_fixed_lines.append(line)
-        lines = list_fixed_lines
-
-        processed_lines = []
-        in_block = False
-        indent = 0
-        for line in lines:
-            match = re.match(r'^(\s{2,})(```.*)$', line.rstrip())
-            if match and not in_block:
-                indent = len(match.group(1))
-                processed_lines.append(match.group(2))
-                in_block = True
-            elif in_block:
-                if line.strip() == '```':
-                    processed_lines.append('```')
-                    in_block = False
-                else:
-                    processed_lines.append(line[indent:] if line.startswith(' '*indent) else line.strip())
-            else:
-                processed_lines.append(line)
-                
-        md_content_fixed = '\n'.join(processed_lines)
-        
-        md = markdown.Markdown(extensions=['fenced_code', 'tables', 'toc', 'codehilite'])
-        html_content = md.convert(md_content_fixed)
-        html_content = nh3.clean(html_content, attributes={**nh3.ALLOWED_ATTRIBUTES, "*": {"class", "id", "style"}})
-        
-        # Replace python-markdown encoded mermaid blocks with actual divs
-        html_content = re.sub(
-            r'<pre[^>]*><code class="language-mermaid">(.*?)</code></pre>',
-            lambda m: f'<div class="mermaid">\n{m.group(1).replace("&lt;", "<").replace("&gt;", ">").replace("&amp;", "&")}\n</div>',
-            html_content,
-            flags=re.DOTALL | re.IGNORECASE
+    # Replace python-markdown encoded mermaid blocks with actual divs. The
+    # source stays entity-escaped: unescaping it here would re-inject markup
+    # that nh3 just sanitized, and mermaid decodes entities itself.
+    if 'class="language-' in html_content:
+        html_content = MERMAID_BLOCK_RE.sub(
+            lambda m: f'<div class="mermaid">\n{m.group(1)}\n</div>',
+            html_content
         )
-        
-        # Fix double-escaped backslashes inside LaTeX math blocks
-        # python-markdown escapes \ to \\ in paragraph text, which breaks KaTeX
-        def fix_latex_escapes(m):
-            return m.group(0).replace('\\\\', '\\')
-        
+    
+    if '$' in html_content:
         # Fix display math $$...$$
-        html_content = re.sub(r'\$\$.*?\$\$', fix_latex_escapes, html_content, flags=re.DOTALL)
+        html_content = DISPLAY_MATH_RE.sub(fix_latex_escapes, html_content)
         # Fix inline math $...$  (but not $$)
-        html_content = re.sub(r'(?<!\$)\$(?!\$)(.+?)(?<!\$)\$(?!\$)', fix_latex_escapes, html_content)
-        
-        return html_content
-
-    html_content = await loop.run_in_executor(None, parse_markdown, md_content)
+        html_content = INLINE_MATH_RE.sub(fix_latex_escapes, html_content)
     
-    return {
-        "title": path,
-        "html": html_content,
-        "raw": md_content,
-        "mtime": file_path.stat().st_mtime
-    }
+    return html_content
 
-@app.post("/api/file")
-async def save_file(req: EditRequest):
-    file_path = (cfg.docs_dir / req.req_path).resolve() if hasattr(req, 'req_path') else (cfg.docs_dir / req.path).resolve()
+# Split at '## ' headings that start a block outside code fences. Fenced
+# blocks are located with fenced_code's own pattern so that nested or longer
+# fences, and fence-like lines with an info string, are treated exactly as the
+# whole-document render treats them. Reference link definitions are collected
+# too, since any section may use them. Only a definition on a line of its own,
+# between blank lines or other definitions, is certain to be one in the whole
+# render; any other line that looks like one (in a blockquote, list item or
+# paragraph) or a repeated label (where the last definition wins) returns
+# None, and the document is rendered whole.
+def split_sections(text):
+    fenced = [m.span() for m in FENCED_BLOCK_RE.finditer(text)]
+    lines = text.split('\n')
+    sections, ref_defs, labels, current = [], [], set(), []
+    span_index, offset = 0, 0
+    prev_is_def = False
+    for i, line in enumerate(lines):
+        while span_index < len(fenced) and fenced[span_index][1] <= offset:
+            span_index += 1
+        in_fence = span_index < len(fenced) and fenced[span_index][0] <= offset
+        offset += len(line) + 1
+        is_def = False
+        if in_fence:
+            pass
+        elif line.startswith('## ') and current and not current[-1].strip():
+            sections.append('\n'.join(current))
+            current = []
+        elif ']:' in line:
+            m = REF_DEF_RE.match(line)
+            if m is None:
+                return None
+            label = m.group(1).strip().lower()
+            following = lines[i + 1] if i + 1 < len(lines) else ''
+            if (label in labels
+                    or (current and current[-1].strip() and not prev_is_def)
+                    or (following.strip() and not REF_DEF_RE.match(following))):
+                return None
+            labels.add(label)
+            ref_defs.append(line)
+            is_def = True
+        current.append(line)
+        prev_is_def = is_def
+    sections.append('\n'.join(current))
+    return sections, ref_defs
+
+def dedupe_heading_ids(html_content):
+    # Sections get their heading ids from separate toc runs; renumber repeats
+    # across sections the same way toc does within a single document
+    seen, resume = set(), {}
+
+    def renumber(m):
+        heading_id = m.group(2)
+        if heading_id in seen:
+            # toc's unique() walks id, id_1, id_2, ...; resume where the last
+            # walk for this id stopped instead of starting over each time
+            base = heading_id
+            heading_id = resume[base] = toc_unique(resume.get(base, base), seen)
+        else:
+            seen.add(heading_id)
+        return f'{m.group(1)}{heading_id}"'
+
+    return HEADING_ID_RE.sub(renumber, html_content)
+
+def render_sections(text):
+    # Large documents are rendered per section with each section's HTML cached
+    # by content hash, so an edit only re-renders the section it touched
+    split = split_sections(text)
+    if split is None:
+        return render_html(text)
+    sections, ref_defs = split
+    preamble = '\n'.join(ref_defs) + '\n\n' if ref_defs else ''
+    parts = []
+    for section in sections:
+        source = preamble + section + SECTION_END
+        digest = hashlib.blake2b(source.encode('utf-8'), digest_size=8).digest()
+        with section_cache_lock:
+            html_content = section_cache.get(digest)
+            if html_content is not None:
+                section_cache.move_to_end(digest)
+        if html_content is None:
+            html_content = render_html(source)
+            # Markdown strips the output, which would lose the whitespace a
+            # whole-document render puts after the section's last block
+            # (code blocks leave an extra newline); a trailing marker
+            # paragraph keeps it, and is cut off again here
+            if html_content.endswith(SECTION_END_HTML):
+                html_content = html_content[:-len(SECTION_END_HTML)]
+            else:
+                html_content += '\n'
+            with section_cache_lock:
+                section_cache[digest] = html_content
+                if len(section_cache) > SECTION_CACHE_SIZE:
+                    section_cache.popitem(last=False)
+        parts.append(html_content)
+    return dedupe_heading_ids(''.join(parts).rstrip())
+
+def encode_file_payload(raw, html_content, mtime):
+    # Everything but the title is fixed for a given file version, so it is
+    # encoded once per render and cached; file_response splices in the title
+    payload = json.dumps(
+        {"html": html_content, "raw": raw, "mtime": mtime},
+        ensure_ascii=False,
+        separators=(',', ':')
+    )
+    return payload[1:].encode('utf-8')
+
+def load_markdown(file_path, mtime):
+    # Read and render in the same worker thread: one executor hop instead of
+    # aiofiles' separate open/read/close hops followed by the render hop
+    with open(file_path, 'r', encoding='utf-8') as f:
+        md_content = f.read()
+
+    # Byte-identical rewrites (editor auto-save, regenerated docs) move the
+    # mtime but not the content; reuse their HTML instead of re-rendering
+    digest = hashlib.blake2b(md_content.encode('utf-8'), digest_size=8).hexdigest()
+    with html_cache_lock:
+        html_content = html_cache.get(digest)
+        if html_content is not None:
+            html_cache.move_to_end(digest)
+    if html_content is None:
+        html_content = parse_markdown(md_content)
+        if len(html_content) <= HTML_CACHE_BYTES:
+            with html_cache_lock:
+                if digest not in html_cache:
+                    html_cache[digest] = html_content
+                    html_cache_state["bytes"] += len(html_content)
+                while html_cache_state["bytes"] > HTML_CACHE_BYTES:
+                    _, evicted = html_cache.popitem(last=False)
+                    html_cache_state["bytes"] -= len(evicted)
+
+    return f'"{RENDER_VERSION}-{digest}"', encode_file_payload(md_content, html_content, mtime)
+
+def file_response(title, payload, etag):
+    body = b'{"title":' + json.dumps(title, ensure_ascii=False).encode('utf-8') + b',' + payload
+    return Response(
+        content=body,
+        media_type="application/json",
+        headers={"ETag": etag, "Cache-Control": "no-cache"}
+    )
+
+def resolve_doc_path(path):
+    # Resolve a client-supplied path and reject anything outside docs_dir.
+    # docs_dir is resolved once at startup, so only the request path is.
+    file_path = (cfg.docs_dir / path).resolve()
     try:
-        file_path.relative_to(cfg.docs_dir.resolve())
+        file_path.relative_to(cfg.docs_dir)
     except ValueError:
         raise HTTPException(status_code=403, detail="Access Denied")
+    return file_path
+
+@app.get("/api/file")
+async def get_file(request: Request, path: str = ""):
+    if not path:
+        path = cfg.default_file
+        
+    file_path = resolve_doc_path(path)
+
+    if not file_path.exists() or file_path.suffix.lower() != '.md':
+        raise HTTPException(status_code=404, detail="Markdown file not found")
+
+    st = file_path.stat()
+    cache_key = str(file_path)
+    signature = (st.st_mtime_ns, st.st_size)
+
+    cached = render_cache.get(cache_key)
+    if cached and cached[0] == signature:
+        render_cache.move_to_end(cache_key)
+        _, etag, payload = cached
+    else:
+        loop = asyncio.get_running_loop()
+        etag, payload = await loop.run_in_executor(None, load_markdown, file_path, st.st_mtime)
+        drop_render_payload(cache_key)
+        if len(payload) <= RENDER_CACHE_BYTES:
+            render_cache[cache_key] = (signature, etag, payload)
+            render_cache_state["bytes"] += len(payload)
+            while render_cache_state["bytes"] > RENDER_CACHE_BYTES:
+                _, (_, _, evicted) = render_cache.popitem(last=False)
+                render_cache_state["bytes"] -= len(evicted)
+
+    # The ETag is a content hash, so the browser's If-None-Match revalidation
+    # also answers 304 when a file was rewritten with identical content
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers={"ETag": etag})
+
+    return file_response(path, payload, etag)
+
+@app.post("/api/file")
+async def save_file(req: EditRequest):
+    file_path = resolve_doc_path(req.path)
         
     async with aiofiles.open(file_path, mode='w', encoding='utf-8') as f:
         await f.write(req.content)
@@ -249,24 +511,19 @@ async def save_file(req: EditRequest):
     nav_cache["mtime"] = 0
     return {"status": "ok"}
 
-from fastapi.responses import FileResponse
-import mimetypes
-
 @app.get("/api/media")
 async def get_media(path: str):
-    file_path = (cfg.docs_dir / path).resolve()
-    try:
-        # Check if it's within docs_dir
-        file_path.relative_to(cfg.docs_dir.resolve())
-    except ValueError:
-        raise HTTPException(status_code=403, detail="Access Denied")
+    file_path = resolve_doc_path(path)
 
     if not file_path.exists() or not file_path.is_file():
         # Fallback: if 'docs/images/sawtooth.png' fails, try 'images/sawtooth.png' in the root
         parts = path.split('/')
         found = False
         for i in range(1, len(parts)):
-            fallback = (cfg.docs_dir / '/'.join(parts[i:])).resolve()
+            try:
+                fallback = resolve_doc_path('/'.join(parts[i:]))
+            except HTTPException:
+                continue
             if fallback.exists() and fallback.is_file():
                 file_path = fallback
                 found = True
@@ -277,16 +534,37 @@ async def get_media(path: str):
     mime_type, _ = mimetypes.guess_type(str(file_path))
     return FileResponse(path=file_path, media_type=mime_type)
 
+def read_search_text(file_path):
+    key = str(file_path)
+    mtime = os.stat(key).st_mtime_ns
+    with search_cache_lock:
+        cached = search_cache.get(key)
+        if cached and cached[0] == mtime:
+            search_cache.move_to_end(key)
+            return cached[1]
+
+    with open(key, 'r', encoding='utf-8', errors='ignore') as f:
+        content = f.read().lower()
+    with search_cache_lock:
+        stale = search_cache.pop(key, None)
+        if stale:
+            search_cache_state["bytes"] -= len(stale[1])
+        if len(content) <= SEARCH_CACHE_BYTES:
+            search_cache[key] = (mtime, content)
+            search_cache_state["bytes"] += len(content)
+            while search_cache_state["bytes"] > SEARCH_CACHE_BYTES:
+                _, (_, evicted) = search_cache.popitem(last=False)
+                search_cache_state["bytes"] -= len(evicted)
+    return content
+
 @app.get("/api/search")
 async def search(q: str):
-    import subprocess
     query = q.lower()
     results = []
     
     def run_search(search_query):
         res = []
         if search_query:
-            import glob
             search_query_lower = search_query.lower()
             try:
                 # Walk the docs_dir recursively
@@ -303,16 +581,15 @@ async def search(q: str):
                             continue
                             
                         try:
-                            with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
-                                content = f.read().lower()
-                                if search_query_lower in content:
-                                    rel_path = file_path.relative_to(cfg.docs_dir)
-                                    res.append({
-                                        'path': str(rel_path),
-                                        'title': file_path.stem
-                                    })
-                                    if len(res) >= 50:
-                                        return res
+                            content = read_search_text(file_path)
+                            if search_query_lower in content:
+                                rel_path = file_path.relative_to(cfg.docs_dir)
+                                res.append({
+                                    'path': str(rel_path),
+                                    'title': file_path.stem
+                                })
+                                if len(res) >= 50:
+                                    return res
                         except Exception:
                             continue
             except Exception:
@@ -325,4 +602,6 @@ async def search(q: str):
     return {"results": results}
 
 if __name__ == "__main__":
+    # Only needed when run as a script; `uvicorn main:app` imports it anyway
+    import uvicorn
     uvicorn.run("main:app", host="0.0.0.0", port=8001, reload=True)
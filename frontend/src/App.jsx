@@ -94,9 +94,12 @@ function App() {
     evtSource.onmessage = (event) => {
       const data = JSON.parse(event.data)
       if (data.type === 'file_change') {
-        fetch('/api/nav').then(res => res.json()).then(data => setNavItems(data))
+        // Edits to existing files cannot change the tree; only adds/deletes can
+        if (data.change !== 'modified') {
+          fetch('/api/nav').then(res => res.json()).then(data => setNavItems(data))
+        }
         const cFile = currentFileRef.current
-        if (cFile && data.path.replace(/\\/g, '/').endsWith(cFile)) {
+        if (cFile && data.path === cFile) {
           fetch(`/api/file?path=${encodeURIComponent(cFile)}`)
             .then(res => {
               if (!res.ok) throw new Error("Not Found")
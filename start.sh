@@ -6,7 +6,11 @@ cd "$(dirname "$0")"
 echo "🛑 Cleaning up any old instances..."
 pkill -f "uvicorn main:app --port 8001" 2>/dev/null || true
 pkill -f "vite" 2>/dev/null || true
-sleep 1
+# Wait for the old instances to exit (up to 1s) instead of a fixed sleep
+for _ in $(seq 1 50); do
+    pgrep -f "uvicorn main:app --port 8001|vite" > /dev/null || break
+    sleep 0.02
+done
 
 echo "🚀 Starting Backend (FastAPI on port 8001)..."
 cd backend
@@ -22,7 +26,14 @@ FRONTEND_PID=$!
 cd ..
 
 echo "⏳ Waiting for services to initialize..."
-sleep 3
+# Probe both ports with a TCP connect until they accept (up to 3s) instead of
+# a fixed sleep; stop early if either process has already exited
+port_open() { (exec 3<>"/dev/tcp/localhost/$1") 2>/dev/null; }
+for _ in $(seq 1 30); do
+    port_open 8001 && port_open 8000 && break
+    kill -0 $BACKEND_PID 2>/dev/null && kill -0 $FRONTEND_PID 2>/dev/null || break
+    sleep 0.1
+done
 
 # Check status
 BACKEND_OK=0